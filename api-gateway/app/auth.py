@@ -0,0 +1,68 @@
+from collections import OrderedDict
+from jose import JWTError, jwt
+from urllib.parse import quote
+import os
+import time
+
+SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
+ALGORITHM = "HS256"
+CLAIMS_CACHE_SIZE = int(os.getenv("GATEWAY_CLAIMS_CACHE_SIZE", "10000"))
+
+# Identity headers trusted by backends running with TRUSTED_UPSTREAM enabled.
+# Client-supplied copies are always stripped before forwarding. x-user-name is
+# percent-encoded UTF-8, since usernames need not fit in a Latin-1 header.
+IDENTITY_HEADERS = {b"x-user-id", b"x-user-name", b"x-user-role"}
+
+class ClaimsCache:
+    """Bounded LRU of decoded token claims, each entry valid until the token's ``exp``."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def get(self, token: str):
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        expires_at, claims = entry
+        if expires_at <= time.time():
+            del self._entries[token]
+            return None
+        self._entries.move_to_end(token)
+        return claims
+
+    def put(self, token: str, claims: dict):
+        self._entries[token] = (claims["exp"], claims)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+claims_cache = ClaimsCache(CLAIMS_CACHE_SIZE)
+
+def verify_token(token: str):
+    claims = claims_cache.get(token)
+    if claims is not None:
+        return claims
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    # Refresh tokens are only good for /auth/refresh, never as bearer credentials.
+    if claims.get("sub") is None or "exp" not in claims or claims.get("type") == "refresh":
+        return None
+    claims_cache.put(token, claims)
+    return claims
+
+def identity_headers(authorization: str):
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return []
+    claims = verify_token(token)
+    if claims is None:
+        return []
+    headers = [(b"x-user-name", quote(str(claims["sub"]), safe="").encode("latin-1"))]
+    if claims.get("uid") is not None:
+        headers.append((b"x-user-id", str(claims["uid"]).encode("latin-1")))
+    if claims.get("role") is not None:
+        headers.append((b"x-user-role", str(claims["role"]).encode("latin-1")))
+    return headers
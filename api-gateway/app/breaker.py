@@ -0,0 +1,86 @@
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    """Rolling-window circuit breaker for a single upstream.
+
+    A call counts as failed when it raised, returned a 5xx status or took longer
+    than ``slow_call_seconds``. Once at least ``min_calls`` have been seen within
+    ``window_seconds`` and the failure ratio reaches ``failure_ratio`` the breaker
+    opens and rejects calls for ``open_seconds``, after which a limited number of
+    trial calls decide whether it closes again. A trial slot that gets no outcome
+    within ``open_seconds`` is handed out again.
+    """
+
+    def __init__(self, failure_ratio=0.5, min_calls=20, window_seconds=30.0,
+                 slow_call_seconds=5.0, open_seconds=15.0, half_open_calls=1):
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+
+        self.state = CLOSED
+        self._calls = deque()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trials = 0
+        self._trial_started = 0.0
+
+    def allow(self):
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now - self._opened_at < self.open_seconds:
+                return False
+            self.state = HALF_OPEN
+            self._trials = 0
+        if self.state == HALF_OPEN:
+            if self._trials >= self.half_open_calls:
+                # Outstanding trials that never reported back must not pin the breaker here.
+                if now - self._trial_started < self.open_seconds:
+                    return False
+                self._trials = 0
+            self._trials += 1
+            self._trial_started = now
+        return True
+
+    def release(self):
+        """Give back the slot of an allowed call that ended without an outcome, e.g.
+        because the client went away mid-request."""
+        if self.state == HALF_OPEN and self._trials:
+            self._trials -= 1
+
+    def record(self, ok: bool, elapsed: float):
+        failed = not ok or elapsed >= self.slow_call_seconds
+        if self.state == HALF_OPEN:
+            if failed:
+                self._open()
+            else:
+                self._reset()
+            return
+
+        now = time.monotonic()
+        self._calls.append((now, failed))
+        self._failures += failed
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            _, expired_failed = self._calls.popleft()
+            self._failures -= expired_failed
+
+        if len(self._calls) >= self.min_calls and self._failures / len(self._calls) >= self.failure_ratio:
+            self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._calls.clear()
+        self._failures = 0
+
+    def _reset(self):
+        self.state = CLOSED
+        self._calls.clear()
+        self._failures = 0
@@ -0,0 +1,142 @@
+from contextvars import ContextVar
+from prometheus_client import CONTENT_TYPE_LATEST, Gauge, Histogram, generate_latest
+from starlette.responses import Response
+import logging
+import os
+import time
+import uuid
+
+REQUEST_ID_HEADER = "X-Request-ID"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+# Set per request by the middleware; log records and outgoing calls read it from here.
+request_id_var = ContextVar("request_id", default="-")
+# [query count, query seconds] for the current request, updated by the engine hooks.
+_db_stats = ContextVar("db_stats", default=None)
+_db_instrumented = False
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time to send the complete response", ["method", "route", "status"]
+)
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "Requests currently being served", ["method"])
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries", "Database queries issued per request", ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+REQUEST_DB_SECONDS = Histogram("http_request_db_seconds", "Time spent in database queries per request", ["route"])
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "Time per database query")
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Database connections currently checked out of the pool")
+DB_POOL_SIZE = Gauge("db_pool_size", "Configured size of the database connection pool")
+
+# Coroutines run before each scrape to refresh gauges that need I/O to read.
+scrape_hooks = []
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+def configure_logging():
+    handler = logging.StreamHandler()
+    handler.addFilter(RequestIdFilter())
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+    # Only this codebase's loggers; uvicorn keeps its own handlers.
+    logger = logging.getLogger("app")
+    logger.addHandler(handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+def route_name(scope):
+    if "route_name" in scope:
+        return scope["route_name"]
+    endpoint = scope.get("endpoint")
+    return getattr(endpoint, "__name__", "unmatched")
+
+class ObservabilityMiddleware:
+    """Records per-route latency, in-flight requests and database work, and tags every
+    request and response with an ``X-Request-ID`` (reusing the caller's when present).
+
+    Plain ASGI rather than ``BaseHTTPMiddleware`` so streamed responses pass through
+    untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for key, value in scope["headers"]:
+            if key == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        request_id = request_id or uuid.uuid4().hex
+        request_token = request_id_var.set(request_id)
+        stats = [0, 0.0]
+        stats_token = _db_stats.set(stats)
+        method = scope["method"]
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_request_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                if not any(key.lower() == b"x-request-id" for key, _ in headers):
+                    headers.append((b"x-request-id", request_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.labels(method).inc()
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            REQUESTS_IN_PROGRESS.labels(method).dec()
+            route = route_name(scope)
+            REQUEST_LATENCY.labels(method, route, str(status)).observe(time.perf_counter() - started)
+            if _db_instrumented:
+                REQUEST_DB_QUERIES.labels(route).observe(stats[0])
+                REQUEST_DB_SECONDS.labels(route).observe(stats[1])
+            _db_stats.reset(stats_token)
+            request_id_var.reset(request_token)
+
+def instrument_engine(engine):
+    # Imported here so services without a database (the gateway) need no SQLAlchemy.
+    from sqlalchemy import event
+
+    global _db_instrumented
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_started
+        DB_QUERY_SECONDS.observe(elapsed)
+        stats = _db_stats.get()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += elapsed
+
+    DB_POOL_CHECKED_OUT.set_function(sync_engine.pool.checkedout)
+    DB_POOL_SIZE.set_function(sync_engine.pool.size)
+    _db_instrumented = True
+
+async def metrics(request):
+    for hook in scrape_hooks:
+        await hook()
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+def instrument_app(app, engine=None):
+    """Add request metrics, request IDs and ``/metrics`` to ``app``; call before
+    registering any catch-all route."""
+    configure_logging()
+    app.add_middleware(ObservabilityMiddleware)
+    app.add_route("/metrics", metrics, include_in_schema=False)
+    if engine is not None:
+        instrument_engine(engine)
@@ -0,0 +1,171 @@
+import asyncio
+import httpx
+import logging
+import os
+import random
+import time
+from fastapi import HTTPException, Request
+from starlette.responses import StreamingResponse
+
+from .auth import IDENTITY_HEADERS, identity_headers
+from .observability import request_id_var
+from .routing import IDEMPOTENT_METHODS
+
+logger = logging.getLogger(__name__)
+
+POOL_MAX_KEEPALIVE = int(os.getenv("GATEWAY_POOL_MAX_KEEPALIVE", "20"))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("GATEWAY_POOL_KEEPALIVE_EXPIRY", "30"))
+HTTP2_ENABLED = os.getenv("GATEWAY_HTTP2", "false").lower() in ("1", "true", "yes")
+CONNECT_TIMEOUT = float(os.getenv("GATEWAY_CONNECT_TIMEOUT", "2"))
+RETRY_BACKOFF = float(os.getenv("GATEWAY_RETRY_BACKOFF", "0.05"))
+RETRY_STATUSES = {502, 503, 504}
+
+# Connection-scoped headers that must not be forwarded by a proxy (RFC 7230, section 6.1).
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+}
+# Added by the gateway's own server; forwarding the upstream copies would duplicate them.
+SERVER_HEADERS = {"date", "server"}
+
+clients = {}
+
+async def open_clients(upstreams):
+    for upstream in upstreams:
+        limits = httpx.Limits(
+            max_connections=upstream.max_connections,
+            max_keepalive_connections=min(POOL_MAX_KEEPALIVE, upstream.max_connections),
+            keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+        )
+        clients[upstream.name] = httpx.AsyncClient(base_url=upstream.url, limits=limits, http2=HTTP2_ENABLED)
+
+async def close_clients():
+    while clients:
+        _, client = clients.popitem()
+        await client.aclose()
+
+def forward_headers(request: Request):
+    headers = [
+        (key, value)
+        for key, value in request.headers.raw
+        if key.decode("latin-1").lower() not in HOP_BY_HOP_HEADERS
+        and key.lower() != b"host"
+        and key.lower() not in IDENTITY_HEADERS
+        and key.lower() not in (b"x-forwarded-for", b"x-request-id")
+    ]
+    headers.append((b"x-request-id", request_id_var.get().encode("latin-1")))
+    # The gateway is the edge, so the peer address is the client; upstreams use it for throttling.
+    if request.client is not None:
+        headers.append((b"x-forwarded-for", request.client.host.encode("latin-1")))
+    return headers + identity_headers(request.headers.get("authorization"))
+
+async def _send(client, request: Request, path: str, headers, content, timeout):
+    upstream_request = client.build_request(
+        method=request.method,
+        url=f"/{path}",
+        headers=headers,
+        params=request.query_params.multi_items(),
+        content=content,
+    )
+    return await client.send(upstream_request, stream=True, timeout=timeout)
+
+async def _send_with_retries(upstream, route, request: Request, path: str):
+    client = clients[upstream.name]
+    timeout = httpx.Timeout(route.timeout, connect=CONNECT_TIMEOUT)
+    headers = forward_headers(request)
+    retries = route.retries if request.method in IDEMPOTENT_METHODS else 0
+    # A streamed body can only be consumed once, so buffer it when the request may be replayed.
+    content = await request.body() if retries else request.stream()
+
+    attempt = 0
+    while True:
+        started = time.monotonic()
+        try:
+            response = await _send(client, request, path, headers, content, timeout)
+        except httpx.TransportError:
+            upstream.breaker.record(False, time.monotonic() - started)
+            if attempt >= retries:
+                raise
+        except BaseException:
+            # Cancelled, client disconnect or a bug: no outcome to record, but the slot must be freed.
+            upstream.breaker.release()
+            raise
+        else:
+            upstream.breaker.record(response.status_code < 500, time.monotonic() - started)
+            if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                return response
+            await response.aclose()
+
+        attempt += 1
+        await asyncio.sleep(RETRY_BACKOFF * 2 ** (attempt - 1) * (1 + random.random()))
+        # Checked after the backoff so no breaker slot is held while sleeping.
+        if not upstream.breaker.allow():
+            raise HTTPException(status_code=503, detail="Service Unavailable")
+
+class UpstreamResponse(StreamingResponse):
+    """Relays a streamed upstream response and frees its connection and ``in_flight`` slot
+    exactly once, whether the body completes, the upstream breaks mid-body or the client
+    goes away before the body is read."""
+
+    def __init__(self, upstream, upstream_response):
+        self.upstream = upstream
+        self.upstream_response = upstream_response
+        self.released = False
+        super().__init__(self.relay(), status_code=upstream_response.status_code)
+
+    async def release(self):
+        if self.released:
+            return
+        self.released = True
+        try:
+            await self.upstream_response.aclose()
+        finally:
+            self.upstream.in_flight -= 1
+
+    async def relay(self):
+        try:
+            async for chunk in self.upstream_response.aiter_raw():
+                yield chunk
+        finally:
+            await self.release()
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # A disconnect cancels the stream while the body generator is suspended (or
+            # before it ever started), in which case its own ``finally`` does not run here.
+            await self.release()
+
+async def proxy_request(upstream, route, path: str, request: Request):
+    if upstream.in_flight >= upstream.max_concurrency or not upstream.breaker.allow():
+        raise HTTPException(status_code=503, detail="Service Unavailable")
+
+    upstream.in_flight += 1
+    try:
+        upstream_response = await _send_with_retries(upstream, route, request, path)
+    except httpx.TimeoutException as e:
+        upstream.in_flight -= 1
+        logger.warning("Upstream %s timed out: %r", upstream.name, e)
+        raise HTTPException(status_code=504, detail="Gateway Timeout")
+    except httpx.TransportError as e:
+        upstream.in_flight -= 1
+        logger.warning("Upstream %s failed: %r", upstream.name, e)
+        raise HTTPException(status_code=502, detail="Bad Gateway")
+    except BaseException:
+        upstream.in_flight -= 1
+        raise
+
+    response = UpstreamResponse(upstream, upstream_response)
+    response.raw_headers = [
+        (key, value)
+        for key, value in upstream_response.headers.raw
+        if key.decode("latin-1").lower() not in HOP_BY_HOP_HEADERS | SERVER_HEADERS
+    ]
+    return response
@@ -0,0 +1,68 @@
+from dataclasses import dataclass
+from typing import Optional
+import os
+
+from .breaker import CircuitBreaker
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+@dataclass
+class Upstream:
+    name: str
+    url: str
+    max_concurrency: int
+    max_connections: int
+    breaker: CircuitBreaker
+    in_flight: int = 0
+
+@dataclass
+class Route:
+    prefix: str
+    upstream: str
+    # Read timeout in seconds; None for long-lived streams.
+    timeout: Optional[float] = 10.0
+    retries: int = 0
+
+def _env_float(name, default):
+    return float(os.getenv(name, default))
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+def build_upstream(name: str, url: str, max_concurrency: int = 200, max_connections: int = 100):
+    key = name.upper()
+    breaker = CircuitBreaker(
+        failure_ratio=_env_float(f"{key}_BREAKER_FAILURE_RATIO", "0.5"),
+        min_calls=_env_int(f"{key}_BREAKER_MIN_CALLS", "20"),
+        window_seconds=_env_float(f"{key}_BREAKER_WINDOW_SECONDS", "30"),
+        slow_call_seconds=_env_float(f"{key}_BREAKER_SLOW_CALL_SECONDS", "5"),
+        open_seconds=_env_float(f"{key}_BREAKER_OPEN_SECONDS", "15"),
+    )
+    return Upstream(
+        name=name,
+        url=url,
+        max_concurrency=_env_int(f"{key}_MAX_CONCURRENCY", str(max_concurrency)),
+        max_connections=_env_int(f"{key}_POOL_MAX_CONNECTIONS", str(max_connections)),
+        breaker=breaker,
+    )
+
+class RouteTrie:
+    """Longest-prefix matcher over ``/``-separated path segments."""
+
+    def __init__(self, routes):
+        self._root = {}
+        for route in routes:
+            node = self._root
+            for segment in route.prefix.strip("/").split("/"):
+                node = node.setdefault(segment, {})
+            node[None] = route
+
+    def match(self, path: str) -> Optional[Route]:
+        node = self._root
+        matched = None
+        for segment in path.strip("/").split("/"):
+            node = node.get(segment)
+            if node is None:
+                break
+            matched = node.get(None, matched)
+        return matched
@@ -1,40 +1,56 @@
 from fastapi import FastAPI, HTTPException, Request
-from httpx import AsyncClient
+from app import proxy
+from app.observability import instrument_app
+from app.routing import Route, RouteTrie, build_upstream
 import os
 
 app = FastAPI(title="API Gateway")
+instrument_app(app)
 
 AUTH_SERVICE_URL = os.getenv("AUTH_SERVICE_URL", "http://auth-service:8000")
 TASK_SERVICE_URL = os.getenv("TASK_SERVICE_URL", "http://task-service:8000")
 PROJECT_SERVICE_URL = os.getenv("PROJECT_SERVICE_URL", "http://project-service:8000")
 NOTIFICATION_SERVICE_URL = os.getenv("NOTIFICATION_SERVICE_URL", "http://notification-service:8000")
 
+UPSTREAMS = {
+    "auth": build_upstream("auth", AUTH_SERVICE_URL),
+    "tasks": build_upstream("tasks", TASK_SERVICE_URL),
+    "projects": build_upstream("projects", PROJECT_SERVICE_URL),
+    "notifications": build_upstream("notifications", NOTIFICATION_SERVICE_URL),
+    # Server-sent event streams hold one upstream connection each for their whole lifetime,
+    # so they get their own pool and concurrency cap.
+    "notification_streams": build_upstream(
+        "notification_streams", NOTIFICATION_SERVICE_URL, max_concurrency=10000, max_connections=10000
+    ),
+    # Exports stream for as long as the table takes to read; keep them off the regular tasks pool.
+    "task_exports": build_upstream("task_exports", TASK_SERVICE_URL, max_concurrency=20, max_connections=20),
+}
+
+ROUTES = RouteTrie([
+    Route(prefix="auth", upstream="auth", timeout=5.0),
+    Route(prefix="tasks", upstream="tasks", timeout=10.0, retries=2),
+    Route(prefix="tasks/export", upstream="task_exports", timeout=None),
+    Route(prefix="projects", upstream="projects", timeout=10.0, retries=2),
+    Route(prefix="notifications", upstream="notifications", timeout=5.0, retries=2),
+    Route(prefix="notifications/stream", upstream="notification_streams", timeout=None),
+])
+
+@app.on_event("startup")
+async def startup():
+    await proxy.open_clients(UPSTREAMS.values())
+
+@app.on_event("shutdown")
+async def shutdown():
+    await proxy.close_clients()
+
 @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
 async def gateway(path: str, request: Request):
-    client = AsyncClient()
-
-    if path.startswith("auth"):
-        url = f"{AUTH_SERVICE_URL}/{path}"
-    elif path.startswith("tasks"):
-        url = f"{TASK_SERVICE_URL}/{path}"
-    elif path.startswith("projects"):
-        url = f"{PROJECT_SERVICE_URL}/{path}"
-    elif path.startswith("notifications"):
-        url = f"{NOTIFICATION_SERVICE_URL}/{path}"
-    else:
+    route = ROUTES.match(path)
+    if route is None:
         raise HTTPException(status_code=404, detail="Not Found")
 
-    headers = {key: value for key, value in request.headers.items() if key != "host"}
-    
-    response = await client.request(
-        method=request.method,
-        url=url,
-        headers=headers,
-        params=request.query_params,
-        data=await request.body()
-    )
-
-    return response.json()
+    request.scope["route_name"] = route.prefix
+    return await proxy.proxy_request(UPSTREAMS[route.upstream], route, path, request)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,45 @@
+from app import breaker
+from app.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def tripped(monkeypatch, **kwargs):
+    clock = Clock()
+    monkeypatch.setattr(breaker.time, "monotonic", clock)
+    cb = CircuitBreaker(min_calls=1, open_seconds=10, **kwargs)
+    cb.record(False, 0.1)
+    assert cb.state == OPEN
+    clock.now += 10
+    return cb, clock
+
+def test_success_in_half_open_closes(monkeypatch):
+    cb, _ = tripped(monkeypatch)
+    assert cb.allow()
+    assert cb.state == HALF_OPEN
+    assert not cb.allow()
+    cb.record(True, 0.1)
+    assert cb.state == CLOSED
+    assert cb.allow()
+
+def test_released_trial_frees_the_slot(monkeypatch):
+    cb, _ = tripped(monkeypatch)
+    assert cb.allow()
+    cb.release()
+    assert cb.allow()
+    assert cb.state == HALF_OPEN
+
+def test_abandoned_trial_expires_after_open_seconds(monkeypatch):
+    cb, clock = tripped(monkeypatch)
+    assert cb.allow()
+    # The trial never calls record() or release().
+    clock.now += 5
+    assert not cb.allow()
+    clock.now += 5
+    assert cb.allow()
+    cb.record(False, 0.1)
+    assert cb.state == OPEN
@@ -0,0 +1,48 @@
+import asyncio
+import httpx
+import pytest
+from app.proxy import UpstreamResponse
+
+class Upstream:
+    in_flight = 1
+
+class BrokenStream:
+    status_code = 200
+    closed = 0
+
+    async def aiter_raw(self):
+        yield b"partial"
+        raise httpx.ReadError("upstream went away")
+
+    async def aclose(self):
+        self.closed += 1
+
+async def never_disconnects():
+    await asyncio.sleep(60)
+
+def serve(response, send):
+    asyncio.run(response({"type": "http"}, never_disconnects, send))
+
+def test_broken_body_frees_slot_and_connection():
+    upstream, upstream_response = Upstream(), BrokenStream()
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    with pytest.raises(httpx.ReadError):
+        serve(UpstreamResponse(upstream, upstream_response), send)
+    assert sent[1]["body"] == b"partial"
+    assert upstream.in_flight == 0
+    assert upstream_response.closed == 1
+
+def test_unstarted_body_is_still_released():
+    upstream, upstream_response = Upstream(), BrokenStream()
+
+    async def send(message):
+        raise OSError("client gone")
+
+    with pytest.raises(OSError):
+        serve(UpstreamResponse(upstream, upstream_response), send)
+    assert upstream.in_flight == 0
+    assert upstream_response.closed == 1
@@ -0,0 +1,212 @@
+"""Replay a request mix through the API gateway at a fixed rate and report latency.
+
+    bench/run.sh --rate 200 --duration 60 --baseline bench/baseline.json
+
+``run.sh`` starts the compose stack with ``bench/docker-compose.bench.yml``, which
+publishes each service on 8001-8004, seeds it and passes every service's ``--metrics``
+URL. Against an already running and seeded stack, call this script directly:
+
+    python bench/loadgen.py --gateway http://localhost:8080 --rate 200 --duration 60 \\
+        --metrics tasks=http://localhost:8002/metrics --baseline bench/baseline.json
+
+Each line of the mix file is ``{"name", "method", "path", "body"?, "weight"?}``. Paths may
+use ``{task_id}``, ``{own_task_id}`` (a task owned by the logged-in user), ``{project_id}``
+and ``{user_id}``, filled with random ids from the seeded ranges. Requests are sent
+open-loop: arrivals follow the target rate whatever the response times, and latency is
+measured from each request's scheduled start so a stalled server cannot hide queueing
+delay.
+
+Per-route throughput, errors and p50/p95/p99 come from the client side. Database
+queries per request come from the ``http_request_db_queries`` histograms scraped from
+each ``--metrics`` URL before and after the run; without any, that column is left out.
+With ``--baseline`` the results are compared against a saved run and the exit status is
+1 on a regression; ``--write-baseline`` saves the current run instead.
+"""
+from collections import defaultdict
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+def load_mix(path: str):
+    with open(path) as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    if not entries:
+        sys.exit(f"{path} contains no requests")
+    return entries
+
+def percentile(values, fraction: float):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def login(client: httpx.AsyncClient, username: str, password: str):
+    response = await client.post("/auth/token", data={"username": username, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+async def scrape_db_queries(client: httpx.AsyncClient, targets):
+    """Return ``{"service:route": (query sum, request count)}`` across all targets."""
+    totals = {}
+    for service, url in targets:
+        response = await client.get(url)
+        response.raise_for_status()
+        for family in text_string_to_metric_families(response.text):
+            if family.name != "http_request_db_queries":
+                continue
+            for sample in family.samples:
+                key = f"{service}:{sample.labels['route']}"
+                queries, count = totals.get(key, (0.0, 0.0))
+                if sample.name.endswith("_sum"):
+                    totals[key] = (sample.value, count)
+                elif sample.name.endswith("_count"):
+                    totals[key] = (queries, sample.value)
+    return totals
+
+class Run:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.late = 0
+
+    async def send(self, client, entry, scheduled: float, ids: dict):
+        path = entry["path"].format(**{name: random.randint(1, count) for name, count in ids.items()})
+        try:
+            response = await client.request(entry["method"], path, json=entry.get("body"))
+            failed = response.status_code >= 400
+        except httpx.HTTPError:
+            failed = True
+        self.latencies[entry["name"]].append(time.perf_counter() - scheduled)
+        if failed:
+            self.errors[entry["name"]] += 1
+
+async def generate(client, mix, rate: float, duration: float, ids: dict, sequential: bool):
+    run = Run()
+    weights = [entry.get("weight", 1) for entry in mix]
+    interval = 1.0 / rate
+    total = int(rate * duration)
+    pending = set()
+    started = time.perf_counter()
+    for i in range(total):
+        scheduled = started + i * interval
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        elif delay < -interval:
+            run.late += 1
+        entry = mix[i % len(mix)] if sequential else random.choices(mix, weights)[0]
+        task = asyncio.create_task(run.send(client, entry, scheduled, ids))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+    if pending:
+        await asyncio.wait(pending)
+    return run, time.perf_counter() - started
+
+def summarize(run: Run, elapsed: float, db_before, db_after):
+    routes = {}
+    for name, latencies in sorted(run.latencies.items()):
+        routes[name] = {
+            "requests": len(latencies),
+            "rps": round(len(latencies) / elapsed, 2),
+            "errors": run.errors[name],
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        }
+    db = {}
+    for key, (queries, count) in sorted(db_after.items()):
+        before_queries, before_count = db_before.get(key, (0.0, 0.0))
+        if count > before_count:
+            db[key] = round((queries - before_queries) / (count - before_count), 2)
+    return {"elapsed_s": round(elapsed, 2), "late_sends": run.late, "routes": routes, "db_queries_per_request": db}
+
+def print_report(summary):
+    print(f"{'route':<24}{'requests':>10}{'rps':>10}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, route in summary["routes"].items():
+        print(f"{name:<24}{route['requests']:>10}{route['rps']:>10}{route['errors']:>8}"
+              f"{route['p50_ms']:>10}{route['p95_ms']:>10}{route['p99_ms']:>10}")
+    if summary["db_queries_per_request"]:
+        print(f"\n{'service:route':<40}{'queries/request':>16}")
+        for key, queries in summary["db_queries_per_request"].items():
+            print(f"{key:<40}{queries:>16}")
+    if summary["late_sends"]:
+        print(f"\nwarning: {summary['late_sends']} requests were sent late; the load generator is saturated")
+
+def compare(summary, baseline, tolerance: float):
+    """Return human-readable regressions of ``summary`` against ``baseline``."""
+    regressions = []
+    for name, route in summary["routes"].items():
+        previous = baseline["routes"].get(name)
+        if previous is None:
+            continue
+        for metric in ("p95_ms", "p99_ms"):
+            # Ignore sub-millisecond noise on very fast routes.
+            if route[metric] > previous[metric] * (1 + tolerance) and route[metric] - previous[metric] > 1:
+                regressions.append(f"{name} {metric}: {previous[metric]} -> {route[metric]}")
+        if route["errors"] > previous["errors"]:
+            regressions.append(f"{name} errors: {previous['errors']} -> {route['errors']}")
+    for key, queries in summary["db_queries_per_request"].items():
+        previous = baseline["db_queries_per_request"].get(key)
+        if previous is not None and queries > previous + 0.5:
+            regressions.append(f"{key} queries/request: {previous} -> {queries}")
+    return regressions
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gateway", default="http://localhost:8080")
+    parser.add_argument("--mix", default="bench/traffic.jsonl")
+    parser.add_argument("--rate", type=float, default=100, help="requests per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds of unrecorded load before the run")
+    parser.add_argument("--sequential", action="store_true", help="replay the mix in file order instead of by weight")
+    parser.add_argument("--username", default="user1")
+    parser.add_argument("--password", default="bench")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--projects", type=int, default=50)
+    parser.add_argument("--tasks", type=int, default=20000)
+    parser.add_argument("--owned-tasks", type=int, default=500)
+    parser.add_argument("--metrics", action="append", default=[], metavar="SERVICE=URL",
+                        help="service /metrics endpoint to read DB queries per request from")
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--write-baseline", help="write this run's results to the given file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative latency increase")
+    parser.add_argument("--max-connections", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    mix = load_mix(args.mix)
+    ids = {"task_id": args.tasks, "own_task_id": args.owned_tasks, "project_id": args.projects, "user_id": args.users}
+    targets = [tuple(target.split("=", 1)) for target in args.metrics]
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    async with httpx.AsyncClient(base_url=args.gateway, limits=limits, timeout=30) as client:
+        client.headers["Authorization"] = f"Bearer {await login(client, args.username, args.password)}"
+        if args.warmup:
+            await generate(client, mix, args.rate, args.warmup, ids, args.sequential)
+        db_before = await scrape_db_queries(client, targets)
+        run, elapsed = await generate(client, mix, args.rate, args.duration, ids, args.sequential)
+        db_after = await scrape_db_queries(client, targets)
+
+    summary = summarize(run, elapsed, db_before, db_after)
+    print_report(summary)
+    if args.write_baseline:
+        with open(args.write_baseline, "w") as f:
+            json.dump(summary, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(summary, json.load(f), args.tolerance)
+        if regressions:
+            print("\nregressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nno regressions against baseline")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+"""Micro-benchmarks for per-request hot paths that do not need a running stack.
+
+    python bench/micro.py [--number 20000] [--json results.json]
+
+Each benchmark runs in-process against the service code in this repository and
+reports the best of five timeit repeats, in microseconds per call.
+"""
+from datetime import datetime
+from pathlib import Path
+import argparse
+import importlib
+import json
+import os
+import sys
+import timeit
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def load(component: str, module: str):
+    """Import ``app.<module>`` from one service; each ships its own ``app`` package."""
+    for name in [name for name in sys.modules if name == "app" or name.startswith("app.")]:
+        del sys.modules[name]
+    sys.path.insert(0, str(ROOT / component))
+    try:
+        return importlib.import_module(f"app.{module}")
+    finally:
+        sys.path.pop(0)
+
+def gateway_benchmarks():
+    routing = load("api-gateway", "routing")
+    auth = importlib.import_module("app.auth")
+    from jose import jwt
+
+    trie = routing.RouteTrie([
+        routing.Route(prefix="auth", upstream="auth"),
+        routing.Route(prefix="tasks", upstream="tasks"),
+        routing.Route(prefix="tasks/export", upstream="task_exports"),
+        routing.Route(prefix="projects", upstream="projects"),
+        routing.Route(prefix="notifications", upstream="notifications"),
+        routing.Route(prefix="notifications/stream", upstream="notification_streams"),
+    ])
+    token = jwt.encode({"sub": "user1", "uid": 1, "role": "user", "exp": 2 ** 31 - 1}, auth.SECRET_KEY, algorithm=auth.ALGORITHM)
+    auth.verify_token(token)
+    return {
+        "gateway.route_match": lambda: trie.match("tasks/123/comments"),
+        "gateway.verify_token_cached": lambda: auth.verify_token(token),
+        "gateway.jwt_decode": lambda: jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM]),
+        "gateway.identity_headers": lambda: auth.identity_headers(f"Bearer {token}"),
+    }
+
+def tasks_benchmarks():
+    pagination = load("services/tasks", "pagination")
+    conditional = importlib.import_module("app.conditional")
+    schemas = importlib.import_module("app.schemas")
+    models = importlib.import_module("app.models")
+    responses = importlib.import_module("app.responses")
+
+    now = datetime.utcnow()
+    keys = [models.Task.updated_at, models.Task.id]
+    cursor = pagination.encode_cursor([now, 42], pagination.NEXT)
+    task = schemas.Task(
+        id=1, title="Write quarterly report", description="Collect numbers from every team " * 4,
+        status="todo", priority="high", due_date=now, created_at=now, updated_at=now, user_id=1,
+        tags=[{"id": i, "name": f"tag{i}"} for i in range(3)],
+        comments=[{"id": i, "content": "Looks good", "created_at": now, "task_id": 1, "user_id": 1} for i in range(5)],
+    )
+    page = [(i, now) for i in range(50)]
+    return {
+        "tasks.encode_cursor": lambda: pagination.encode_cursor([now, 42], pagination.NEXT),
+        "tasks.decode_cursor": lambda: pagination.decode_cursor(cursor, keys),
+        "tasks.render_task": lambda: responses.render(task),
+        "tasks.etag_page_of_50": lambda: conditional.make_etag(*page),
+    }
+
+def notifications_benchmarks():
+    stream = load("services/notifications", "stream")
+    event = {"id": 1, "seq": 1, "user_id": 1, "message": "Task updated: Write quarterly report",
+             "created_at": datetime.utcnow().isoformat(), "is_read": False, "count": 1}
+    return {"notifications.format_event": lambda: stream.format_event(event)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="calls per repeat")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    # Importing service modules must not try to reach Redis or Postgres.
+    os.environ.setdefault("CACHE_ENABLED", "false")
+    results = {}
+    for group in (gateway_benchmarks, tasks_benchmarks, notifications_benchmarks):
+        for name, fn in group().items():
+            best = min(timeit.repeat(fn, number=args.number, repeat=5))
+            results[name] = round(best / args.number * 1e6, 3)
+            print(f"{name:<36}{results[name]:>10} us")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,37 @@
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from . import models, schemas
 from .database import get_db
+from .hashing import pool
+from .store import store
+from urllib.parse import unquote
 import os
+import time
+import uuid
 
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+# Accept the identity headers set by the API gateway instead of decoding the JWT again.
+# Only enable when the service is reachable exclusively through the gateway.
+TRUSTED_UPSTREAM = os.getenv("TRUSTED_UPSTREAM", "false").lower() in ("1", "true", "yes")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Pinning min and max to the configured cost flags hashes made with any other
+# cost as needing an update, so they are rehashed on the next successful login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 def verify_password(plain_password, hashed_password):
@@ -21,34 +40,100 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if not user or not verify_password(password, user.hashed_password):
+async def get_user(db: AsyncSession, username: str):
+    result = await db.execute(select(models.User).filter(models.User.username == username))
+    return result.scalars().first()
+
+def client_ip(request: Request):
+    forwarded = request.headers.get("x-forwarded-for")
+    if TRUSTED_UPSTREAM and forwarded:
+        return forwarded.split(",")[-1].strip()
+    return request.client.host if request.client else "unknown"
+
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await get_user(db, username)
+    if not user:
+        return False
+    verified, new_hash = await pool.run(pwd_context.verify_and_update, password, user.hashed_password)
+    if not verified:
         return False
+    if new_hash is not None:
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "type": "access"})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def create_refresh_token(data: dict):
+    to_encode = data.copy()
+    expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    to_encode.update({"exp": expire, "type": "refresh", "jti": uuid.uuid4().hex})
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+def create_tokens(user):
+    claims = {"sub": user.username, "uid": user.id, "role": user.role}
+    return {
+        "access_token": create_access_token(claims),
+        "refresh_token": create_refresh_token(claims),
+        "token_type": "bearer",
+    }
+
+async def redeem_refresh_token(token: str):
+    """Validate a refresh token and revoke it so it cannot be used again."""
+    invalid_token = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise invalid_token
+    if payload.get("type") != "refresh" or payload.get("sub") is None or payload.get("jti") is None:
+        raise invalid_token
+    if not await store.revoke(payload["jti"], int(payload["exp"] - time.time())):
+        raise invalid_token
+    return payload
+
+def decode_token(request: Request, token: str):
+    username = request.headers.get("x-user-name")
+    if TRUSTED_UPSTREAM and username is not None:
+        return schemas.TokenData(username=unquote(username), role=request.headers.get("x-user-role"))
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    username: str = payload.get("sub")
+    if username is None or payload.get("type") == "refresh":
+        return None
+    return schemas.TokenData(username=username)
+
+async def get_user_profile(db: AsyncSession, username: str):
+    profile = await store.get_profile(username)
+    if profile is not None:
+        return schemas.UserOut(**profile)
+    user = await get_user(db, username)
+    if user is None:
+        return None
+    profile = schemas.UserOut.from_orm(user)
+    await store.put_profile(profile.dict())
+    return profile
+
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(username=username)
+        token_data = decode_token(request, token)
     except JWTError:
         raise credentials_exception
-    user = db.query(models.User).filter(models.User.username == token_data.username).first()
+    if token_data is None:
+        raise credentials_exception
+    user = await get_user_profile(db, token_data.username)
     if user is None:
         raise credentials_exception
     return user
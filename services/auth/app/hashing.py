@@ -0,0 +1,85 @@
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
+import asyncio
+import os
+import time
+
+HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", str(os.cpu_count() or 2)))
+# Hashing calls allowed to wait for a worker before new ones are rejected with 503.
+HASH_QUEUE_LIMIT = int(os.getenv("AUTH_HASH_QUEUE_LIMIT", "64"))
+LOGIN_WINDOW = float(os.getenv("AUTH_LOGIN_WINDOW", "300"))
+LOGIN_MAX_FAILURES_PER_USER = int(os.getenv("AUTH_LOGIN_MAX_FAILURES_PER_USER", "5"))
+LOGIN_MAX_FAILURES_PER_IP = int(os.getenv("AUTH_LOGIN_MAX_FAILURES_PER_IP", "50"))
+
+class HashingPool:
+    """Runs bcrypt on a dedicated, bounded set of threads.
+
+    bcrypt releases the GIL, so hashes run in parallel without touching the
+    event loop or the default threadpool that sync endpoints share. Callers
+    beyond the queue limit are shed immediately instead of queueing for seconds.
+    """
+
+    def __init__(self, workers: int, queue_limit: int):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.limit = workers + queue_limit
+        self.pending = 0
+
+    async def run(self, fn, *args):
+        if self.pending >= self.limit:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication is busy, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+class LoginThrottle:
+    """Sliding-window count of failed logins per key, kept in a bounded LRU."""
+
+    def __init__(self, window: float, max_keys: int = 100000):
+        self.window = window
+        self.max_keys = max_keys
+        self.failures = OrderedDict()
+
+    def _recent(self, key: str, now: float):
+        attempts = self.failures.get(key)
+        if attempts is None:
+            return None
+        while attempts and now - attempts[0] >= self.window:
+            attempts.popleft()
+        if not attempts:
+            del self.failures[key]
+            return None
+        return attempts
+
+    def retry_after(self, key: str, limit: int) -> float:
+        """Seconds until ``key`` may try again, or 0 if it is under ``limit``."""
+        now = time.monotonic()
+        attempts = self._recent(key, now)
+        if attempts is None or len(attempts) < limit:
+            return 0
+        return self.window - (now - attempts[-limit])
+
+    def fail(self, key: str):
+        attempts = self.failures.get(key)
+        if attempts is None:
+            attempts = self.failures[key] = deque()
+            if len(self.failures) > self.max_keys:
+                self.failures.popitem(last=False)
+        else:
+            self.failures.move_to_end(key)
+        attempts.append(time.monotonic())
+
+    def reset(self, key: str):
+        self.failures.pop(key, None)
+
+pool = HashingPool(HASH_WORKERS, HASH_QUEUE_LIMIT)
+throttle = LoginThrottle(LOGIN_WINDOW)
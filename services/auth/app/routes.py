@@ -1,34 +1,68 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from . import models, schemas, auth
 from .database import get_db
+from .hashing import LOGIN_MAX_FAILURES_PER_IP, LOGIN_MAX_FAILURES_PER_USER, pool, throttle
+from .store import store
 
 router = APIRouter()
 
 @router.post("/register", response_model=schemas.UserOut)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.username == user.username).first()
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    db_user = await auth.get_user(db, user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    hashed_password = auth.get_password_hash(user.password)
+    hashed_password = await pool.run(auth.get_password_hash, user.password)
     db_user = models.User(username=user.username, email=user.email, hashed_password=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await store.invalidate_profile(db_user.username)
     return db_user
 
 @router.post("/token", response_model=schemas.Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = auth.authenticate_user(db, form_data.username, form_data.password)
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    # Shed repeated failures before paying for a bcrypt verify.
+    user_key = f"user:{form_data.username.lower()}"
+    ip_key = f"ip:{auth.client_ip(request)}"
+    retry_after = max(
+        throttle.retry_after(user_key, LOGIN_MAX_FAILURES_PER_USER),
+        throttle.retry_after(ip_key, LOGIN_MAX_FAILURES_PER_IP),
+    )
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed login attempts",
+            headers={"Retry-After": str(int(retry_after) + 1)},
+        )
+    user = await auth.authenticate_user(db, form_data.username, form_data.password)
     if not user:
+        throttle.fail(user_key)
+        throttle.fail(ip_key)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = auth.create_access_token(data={"sub": user.username, "role": user.role})
-    return {"access_token": access_token, "token_type": "bearer"}
+    throttle.reset(user_key)
+    return auth.create_tokens(user)
+
+@router.post("/refresh", response_model=schemas.Token)
+async def refresh(body: schemas.RefreshRequest, db: AsyncSession = Depends(get_db)):
+    payload = await auth.redeem_refresh_token(body.refresh_token)
+    user = await auth.get_user_profile(db, payload["sub"])
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return auth.create_tokens(user)
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(body: schemas.RefreshRequest):
+    await auth.redeem_refresh_token(body.refresh_token)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 @router.get("/users/me", response_model=schemas.UserOut)
 def read_users_me(current_user: schemas.UserOut = Depends(auth.get_current_active_user)):
@@ -0,0 +1,71 @@
+from fastapi import HTTPException, status
+import json
+import os
+import redis.asyncio as redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "300"))
+
+class AuthStore:
+    """Redis-backed user-profile cache and refresh-token revocation list.
+
+    Profile reads fall back to the database when Redis is unavailable; revocation
+    checks fail closed, since accepting a possibly revoked refresh token is worse
+    than asking the client to log in again.
+    """
+
+    def __init__(self):
+        self._redis = None
+
+    async def start(self):
+        self._redis = redis.from_url(REDIS_URL)
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    async def get_profile(self, username: str):
+        if self._redis is None:
+            return None
+        try:
+            value = await self._redis.get(f"user:{username}")
+        except redis.RedisError as e:
+            logger.warning("Error reading user cache: %s", e)
+            return None
+        return json.loads(value) if value is not None else None
+
+    async def put_profile(self, profile: dict):
+        if self._redis is None:
+            return
+        try:
+            await self._redis.set(f"user:{profile['username']}", json.dumps(profile), ex=USER_CACHE_TTL)
+        except redis.RedisError as e:
+            logger.warning("Error writing user cache: %s", e)
+
+    async def invalidate_profile(self, username: str):
+        if self._redis is None:
+            return
+        try:
+            await self._redis.delete(f"user:{username}")
+        except redis.RedisError as e:
+            logger.warning("Error invalidating user cache: %s", e)
+
+    async def revoke(self, jti: str, ttl: int):
+        """Revoke a refresh token; returns False if it was already revoked.
+
+        The SET NX makes redeeming a refresh token single-use even when two
+        requests race with the same token.
+        """
+        if self._redis is None:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Token store unavailable")
+        try:
+            return bool(await self._redis.set(f"revoked:{jti}", 1, ex=max(ttl, 1), nx=True))
+        except redis.RedisError as e:
+            logger.warning("Error revoking token: %s", e)
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Token store unavailable")
+
+store = AuthStore()
@@ -1,10 +1,25 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from app.database import async_engine
+from app.observability import instrument_app
 from app.routes import router as auth_router
+from app.hashing import pool
+from app.store import store
 
-app = FastAPI(title="Auth Service", version="0.1.0")
+app = FastAPI(title="Auth Service", version="0.1.0", default_response_class=ORJSONResponse)
+instrument_app(app, async_engine)
 
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
 
+@app.on_event("startup")
+async def startup():
+    await store.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await store.close()
+    pool.shutdown()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -1,10 +1,60 @@
 from celery import Celery
+from celery.signals import task_postrun, task_prerun, worker_process_shutdown, worker_ready
+from prometheus_client import CollectorRegistry, Histogram, multiprocess, start_http_server
 import os
+import time
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+TASK_QUEUE = "notifications-queue"
+# Port for the worker's /metrics; prefork children report through PROMETHEUS_MULTIPROC_DIR.
+METRICS_PORT = os.getenv("CELERY_METRICS_PORT")
 
-celery_app = Celery("notifications", broker=REDIS_URL, backend=REDIS_URL)
+celery_app = Celery("notifications", broker=REDIS_URL, backend=REDIS_URL, include=["app.tasks"])
 
 celery_app.conf.task_routes = {
-    "app.tasks.*": "notifications-queue"
-}
\ No newline at end of file
+    "app.tasks.*": TASK_QUEUE
+}
+
+celery_app.conf.update(
+    # Nothing reads task results, so skip the result backend round-trip per task.
+    task_ignore_result=True,
+    # Ack after the insert commits so a crashed worker's batch is redelivered.
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=int(os.getenv("CELERY_PREFETCH_MULTIPLIER", "8")),
+    broker_pool_limit=int(os.getenv("CELERY_BROKER_POOL_LIMIT", "10")),
+)
+
+
+celery_app.conf.beat_schedule = {
+    "purge-read-notifications": {
+        "task": "app.tasks.purge_read_notifications",
+        "schedule": float(os.getenv("NOTIFICATION_RETENTION_INTERVAL", "3600")),
+    },
+}
+
+TASK_LATENCY = Histogram("celery_task_duration_seconds", "Time to run a Celery task", ["task", "state"])
+
+_task_started = {}
+
+@task_prerun.connect
+def _record_task_start(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+@task_postrun.connect
+def _record_task_latency(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        TASK_LATENCY.labels(task.name, state or "UNKNOWN").observe(time.perf_counter() - started)
+
+@worker_ready.connect
+def _serve_metrics(**kwargs):
+    if METRICS_PORT and os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        start_http_server(int(METRICS_PORT), registry=registry)
+
+@worker_process_shutdown.connect
+def _mark_process_dead(pid=None, **kwargs):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -1,15 +1,40 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, Boolean, Index, Sequence
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
 Base = declarative_base()
 
+# Drawn again whenever a compacted row is bumped, so stream replay by ``seq`` sees bumps.
+notification_seq = Sequence("notifications_seq_seq")
+
 class Notification(Base):
     __tablename__ = "notifications"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, index=True)
+    user_id = Column(Integer)
     message = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
-    is_read = Column(Boolean, default=False)
\ No newline at end of file
+    is_read = Column(Boolean, default=False)
+    count = Column(Integer, nullable=False, default=1, server_default="1")
+    seq = Column(BigInteger, notification_seq, nullable=False, server_default=notification_seq.next_value())
+
+    __table_args__ = (
+        Index("ix_notifications_user_id_id", "user_id", "id"),
+        Index("ix_notifications_user_id_seq", "user_id", "seq"),
+        # At most one unread row per message; repeats bump its count instead (see tasks.store_notifications).
+        # Only unread rows are indexed, and the leading user_id also serves the unread badge sum.
+        Index("uq_notifications_user_id_message_unread", "user_id", "message", unique=True,
+              postgresql_where=is_read.is_(False)),
+        Index("ix_notifications_read_created_at", "created_at", postgresql_where=is_read.is_(True)),
+    )
+
+class NotificationArchive(Base):
+    __tablename__ = "notifications_archive"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer)
+    message = Column(String)
+    count = Column(Integer, nullable=False, default=1)
+    created_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
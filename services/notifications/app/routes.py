@@ -1,27 +1,126 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import datetime
 from . import models, schemas, tasks
-from .database import get_db
+from .databases import AsyncSessionLocal, get_db
+from .pagination import paginate
+from .responses import respond
+from .stream import broker, event_stream
+import os
 
 router = APIRouter()
 
+REPLAY_PAGE_SIZE = int(os.getenv("NOTIFICATION_REPLAY_PAGE_SIZE", "100"))
+
+NOTIFICATION_COLUMNS = [models.Notification.id, models.Notification.user_id, models.Notification.message,
+                        models.Notification.created_at, models.Notification.is_read, models.Notification.count,
+                        models.Notification.seq]
+
 @router.post("/", response_model=schemas.Notification)
-def create_notification(notification: schemas.NotificationCreate, db: Session = Depends(get_db)):
+def create_notification(notification: schemas.NotificationCreate):
     tasks.send_notification.delay(notification.user_id, notification.message)
     return {"id": 0, "user_id": notification.user_id, "message": notification.message, "created_at": datetime.utcnow(), "is_read": False}
 
+@router.post("/batch", status_code=202)
+def create_notifications(notifications: List[schemas.NotificationCreate]):
+    tasks.store_notifications.delay([notification.dict() for notification in notifications])
+    return {"accepted": len(notifications)}
+
+@router.post("/fanout", status_code=202)
+def fan_out_notification(fanout: schemas.NotificationFanout):
+    tasks.fan_out_notification.delay(fanout.user_ids, fanout.message)
+    return {"accepted": len(fanout.user_ids)}
+
+async def read_backlog(user_id: int, after: int):
+    # A short-lived session per page: the stream may stay open for hours and must not pin a connection.
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(models.Notification)
+            .filter(models.Notification.user_id == user_id, models.Notification.seq > after)
+            .order_by(models.Notification.seq)
+            .limit(REPLAY_PAGE_SIZE)
+        )
+        return [jsonable_encoder(schemas.Notification.from_orm(notification)) for notification in result.scalars()]
+
+async def replay(user_id: int, page):
+    """Yield ``page`` and every later backlog page until the backlog is exhausted."""
+    while page:
+        for notification in page:
+            yield notification
+        if len(page) < REPLAY_PAGE_SIZE:
+            return
+        page = await read_backlog(user_id, page[-1]["seq"])
+
+@router.get("/stream/{user_id}")
+async def stream_user_notifications(user_id: int, last_event_id: Optional[int] = Header(None)):
+    # Subscribe before reading the backlog so nothing published in between is missed.
+    subscription = broker.subscribe(user_id)
+    first_page = []
+    if last_event_id is not None:
+        # The first page is read up front so a database error still fails the request.
+        try:
+            first_page = await read_backlog(user_id, last_event_id)
+        except Exception:
+            broker.unsubscribe(subscription)
+            raise
+    return StreamingResponse(
+        event_stream(subscription, replay(user_id, first_page)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/user/{user_id}", response_model=List[schemas.Notification])
-def read_user_notifications(user_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    notifications = db.query(models.Notification).filter(models.Notification.user_id == user_id).offset(skip).limit(limit).all()
-    return notifications
+async def read_user_notifications(user_id: int, response: Response, cursor: Optional[str] = None, skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
+    stmt = select(*NOTIFICATION_COLUMNS).filter(models.Notification.user_id == user_id)
+    rows = await paginate(db, stmt, [models.Notification.id], response, cursor=cursor, limit=limit, skip=skip, scalars=False)
+    return respond([row._asdict() for row in rows], response)
+
+@router.get("/user/{user_id}/unread_count", response_model=schemas.UnreadCount)
+async def read_unread_count(user_id: int, db: AsyncSession = Depends(get_db)):
+    # A compacted row stands for `count` notifications; sum them so the badge matches the list.
+    result = await db.execute(
+        select(func.coalesce(func.sum(models.Notification.count), 0))
+        .filter(models.Notification.user_id == user_id, models.Notification.is_read.is_(False))
+    )
+    return {"user_id": user_id, "unread": result.scalar()}
+
+@router.put("/user/{user_id}/read_all", response_model=schemas.ReadResult)
+async def mark_all_as_read(user_id: int, db: AsyncSession = Depends(get_db)):
+    notifications = models.Notification.__table__
+    result = await db.execute(
+        update(notifications)
+        .where(notifications.c.user_id == user_id, notifications.c.is_read.is_(False))
+        .values(is_read=True)
+    )
+    await db.commit()
+    return {"updated": result.rowcount}
+
+@router.put("/read", response_model=schemas.ReadResult)
+async def mark_many_as_read(batch: schemas.NotificationIds, db: AsyncSession = Depends(get_db)):
+    notifications = models.Notification.__table__
+    result = await db.execute(
+        update(notifications)
+        .where(notifications.c.id.in_(batch.ids), notifications.c.is_read.is_(False))
+        .values(is_read=True)
+    )
+    await db.commit()
+    return {"updated": result.rowcount}
 
 @router.put("/{notification_id}/read", response_model=schemas.Notification)
-def mark_notification_as_read(notification_id: int, db: Session = Depends(get_db)):
-    notification = db.query(models.Notification).filter(models.Notification.id == notification_id).first()
+async def mark_notification_as_read(notification_id: int, db: AsyncSession = Depends(get_db)):
+    notifications = models.Notification.__table__
+    result = await db.execute(
+        update(notifications)
+        .where(notifications.c.id == notification_id)
+        .values(is_read=True)
+        .returning(*notifications.c)
+    )
+    notification = result.mappings().first()
     if notification is None:
         raise HTTPException(status_code=404, detail="Notification not found")
-    notification.is_read = True
-    db.commit()
-    db.refresh(notification)
-    return notification
\ No newline at end of file
+    await db.commit()
+    return notification
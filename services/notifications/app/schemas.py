@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 class NotificationBase(BaseModel):
     user_id: int
@@ -13,6 +13,22 @@ class Notification(NotificationBase):
     id: int
     created_at: datetime
     is_read: bool
+    count: int = 1
+    seq: Optional[int] = None
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class NotificationFanout(BaseModel):
+    user_ids: List[int]
+    message: str
+
+class NotificationIds(BaseModel):
+    ids: List[int]
+
+class UnreadCount(BaseModel):
+    user_id: int
+    unread: int
+
+class ReadResult(BaseModel):
+    updated: int
\ No newline at end of file
@@ -0,0 +1,113 @@
+from collections import defaultdict
+import asyncio
+import json
+import os
+import redis.asyncio as redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+EVENTS_CHANNEL = "notifications:events"
+STREAM_QUEUE_SIZE = int(os.getenv("NOTIFICATION_STREAM_QUEUE_SIZE", "100"))
+HEARTBEAT_INTERVAL = float(os.getenv("NOTIFICATION_STREAM_HEARTBEAT", "15"))
+
+class Subscription:
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        self.overflowed = False
+
+    def push(self, notification: dict):
+        try:
+            self.queue.put_nowait(notification)
+        except asyncio.QueueFull:
+            # The client is not keeping up; end its stream so it reconnects and
+            # catches up from the database using Last-Event-ID.
+            self.overflowed = True
+
+class NotificationBroker:
+    """Fans notifications published by the Celery worker out to connected stream clients.
+
+    Each process holds a single Redis pub/sub subscription no matter how many clients
+    are connected; every client gets its own bounded queue.
+    """
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._redis = None
+        self._listener = None
+
+    async def start(self):
+        self._redis = redis.from_url(REDIS_URL)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    async def queue_length(self, queue: str):
+        return await self._redis.llen(queue)
+
+    def subscribe(self, user_id: int):
+        subscription = Subscription(user_id)
+        self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscriptions.get(subscription.user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+
+    def dispatch(self, notifications):
+        for notification in notifications:
+            for subscription in self._subscriptions.get(notification["user_id"], ()):
+                subscription.push(notification)
+
+    async def _listen(self):
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(EVENTS_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.dispatch(json.loads(message["data"]))
+            except (redis.RedisError, OSError) as e:
+                logger.warning("Notification stream listener error: %s", e)
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.reset()
+
+broker = NotificationBroker()
+
+def format_event(notification: dict):
+    # The event id is the row's seq, which moves on every count bump, so Last-Event-ID
+    # replay also picks up bumps to rows the client has already seen.
+    return f"id: {notification['seq']}\nevent: notification\ndata: {json.dumps(notification)}\n\n"
+
+async def event_stream(subscription: Subscription, backlog):
+    sent = set()
+    try:
+        async for notification in backlog:
+            sent.add(notification["seq"])
+            yield format_event(notification)
+        while not subscription.overflowed:
+            try:
+                notification = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            # Skip the copy of anything already sent as part of the backlog; later
+            # count bumps on a compacted row get a new seq and still go out.
+            if notification["seq"] in sent:
+                sent.discard(notification["seq"])
+                continue
+            yield format_event(notification)
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,131 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from . import models
+from .celery_app import celery_app
+from .databases import SessionLocal
+from .stream import EVENTS_CHANNEL
+import json
+import os
+import redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+INSERT_CHUNK_SIZE = int(os.getenv("NOTIFICATION_INSERT_CHUNK_SIZE", "1000"))
+RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", "30"))
+RETENTION_CHUNK_SIZE = int(os.getenv("NOTIFICATION_RETENTION_CHUNK_SIZE", "5000"))
+ARCHIVE_NOTIFICATIONS = os.getenv("NOTIFICATION_ARCHIVE", "true").lower() in ("1", "true", "yes")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+redis_client = redis.Redis.from_url(REDIS_URL)
+
+def publish(rows):
+    events = [
+        {"id": row.id, "user_id": row.user_id, "message": row.message, "created_at": row.created_at.isoformat(), "is_read": False, "count": row.count, "seq": row.seq}
+        for row in rows
+    ]
+    try:
+        redis_client.publish(EVENTS_CHANNEL, json.dumps(events))
+    except redis.RedisError as e:
+        logger.warning("Error publishing notifications: %s", e)
+
+@celery_app.task
+def store_notifications(notifications):
+    """Persist a batch of ``{"user_id", "message"}`` dicts and publish the stored rows
+    to stream subscribers.
+
+    A message that is still unread for that user bumps the existing row's ``count``
+    and ``seq`` instead of adding a row. The unique partial index on unread
+    ``(user_id, message)`` makes this a single ``INSERT ... ON CONFLICT DO UPDATE``,
+    so concurrent batches cannot create duplicates.
+    """
+    now = datetime.utcnow()
+    pending = Counter((notification["user_id"], notification["message"]) for notification in notifications)
+    table = models.Notification.__table__
+    returned = (table.c.id, table.c.user_id, table.c.message, table.c.created_at, table.c.count, table.c.seq)
+    stored = []
+    if not pending:
+        return 0
+    # Sorted so concurrent batches lock conflicting rows in the same order.
+    rows = [
+        {"user_id": user_id, "message": message, "count": n, "created_at": now, "is_read": False}
+        for (user_id, message), n in sorted(pending.items())
+    ]
+    with SessionLocal() as db:
+        for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+            stmt = insert(table).values(rows[start:start + INSERT_CHUNK_SIZE])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.user_id, table.c.message],
+                index_where=table.c.is_read.is_(False),
+                set_={
+                    "count": table.c.count + stmt.excluded.count,
+                    "created_at": stmt.excluded.created_at,
+                    "seq": models.notification_seq.next_value(),
+                },
+            )
+            stored += db.execute(stmt.returning(*returned)).all()
+        db.commit()
+    if stored:
+        publish(stored)
+    return len(notifications)
+
+@celery_app.task
+def fan_out_notification(user_ids, message):
+    return store_notifications([{"user_id": user_id, "message": message} for user_id in user_ids])
+
+@celery_app.task
+def send_notification(user_id, message):
+    return store_notifications([{"user_id": user_id, "message": message}])
+
+
+PURGE_READ = text("""
+    WITH doomed AS (
+        DELETE FROM notifications
+        WHERE id IN (
+            SELECT id FROM notifications
+            WHERE is_read AND created_at < :cutoff
+            ORDER BY created_at
+            LIMIT :chunk
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, user_id, message, count, created_at
+    )
+    SELECT count(*) FROM doomed
+""")
+
+ARCHIVE_READ = text("""
+    WITH doomed AS (
+        DELETE FROM notifications
+        WHERE id IN (
+            SELECT id FROM notifications
+            WHERE is_read AND created_at < :cutoff
+            ORDER BY created_at
+            LIMIT :chunk
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, user_id, message, count, created_at
+    ), moved AS (
+        INSERT INTO notifications_archive (id, user_id, message, count, created_at, archived_at)
+        SELECT id, user_id, message, count, created_at, now() AT TIME ZONE 'utc' FROM doomed
+        RETURNING id
+    )
+    SELECT count(*) FROM moved
+""")
+
+@celery_app.task
+def purge_read_notifications():
+    """Move read notifications older than ``RETENTION_DAYS`` out of the hot table,
+    one committed chunk at a time so locks and WAL stay bounded."""
+    cutoff = datetime.utcnow() - timedelta(days=RETENTION_DAYS)
+    statement = ARCHIVE_READ if ARCHIVE_NOTIFICATIONS else PURGE_READ
+    total = 0
+    with SessionLocal() as db:
+        while True:
+            moved = db.execute(statement, {"cutoff": cutoff, "chunk": RETENTION_CHUNK_SIZE}).scalar()
+            db.commit()
+            total += moved
+            if moved < RETENTION_CHUNK_SIZE:
+                break
+    return total
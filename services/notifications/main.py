@@ -1,7 +1,36 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from app.databases import async_engine
+from app.celery_app import TASK_QUEUE
+from app.observability import instrument_app, scrape_hooks
 from app.routes import router as notifications_router
+from app.stream import broker
+from prometheus_client import Gauge
+import logging
+import redis.asyncio as redis
 
-app = FastAPI(title="Notifications Service", version="0.1.0")
+logger = logging.getLogger("app.main")
+
+CELERY_QUEUE_LENGTH = Gauge("celery_queue_length", "Tasks waiting in the Celery broker queue", ["queue"])
+
+app = FastAPI(title="Notifications Service", version="0.1.0", default_response_class=ORJSONResponse)
+instrument_app(app, async_engine)
+
+async def update_queue_length():
+    try:
+        CELERY_QUEUE_LENGTH.labels(TASK_QUEUE).set(await broker.queue_length(TASK_QUEUE))
+    except redis.RedisError as e:
+        logger.warning("Error reading Celery queue length: %s", e)
+
+scrape_hooks.append(update_queue_length)
+
+@app.on_event("startup")
+async def startup():
+    await broker.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await broker.close()
 
 app.include_router(notifications_router, prefix="/notifications", tags=["notifications"])
 
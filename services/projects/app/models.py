@@ -38,6 +38,11 @@ class Task(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
+    status = Column(String)
+    priority = Column(String)
+    due_date = Column(DateTime)
+    updated_at = Column(DateTime)
+    user_id = Column(Integer, ForeignKey("users.id"))
     project_id = Column(Integer, ForeignKey("projects.id"))
 
     project = relationship("Project", back_populates="tasks")
\ No newline at end of file
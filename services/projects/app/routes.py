@@ -1,62 +1,245 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, noload, selectinload
+from typing import List, Optional
 from . import models, schemas, notifications
+from .cache import cache
+from .conditional import make_etag, not_modified, validators
 from .database import get_db
+from .pagination import paginate
+from .responses import render, respond
+import os
+
+# Statuses that count as finished when computing open and overdue work.
+CLOSED_STATUSES = [status for status in os.getenv("TASK_CLOSED_STATUSES", "done,completed").split(",") if status]
+SUMMARY_CACHE_TTL = int(os.getenv("PROJECT_SUMMARY_CACHE_TTL", "15"))
+BATCH_MAX_IDS = int(os.getenv("PROJECTS_BATCH_MAX_IDS", "100"))
 
 router = APIRouter()
 
+# Columns behind schemas.Project, for list reads that skip building ORM objects.
+PROJECT_COLUMNS = [models.Project.id, models.Project.name, models.Project.description, models.Project.created_at,
+                   models.Project.updated_at, models.Project.owner_id]
+
+def selected_relations(expand: Optional[str], relations):
+    if expand is None:
+        return set(relations)
+    selected = {name.strip() for name in expand.split(",") if name.strip()}
+    unknown = selected - set(relations)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown expand field: {', '.join(sorted(unknown))}")
+    return selected
+
+def load_options(expand: Optional[str], relations: dict):
+    # The owner is always joined into the main query; collections are loaded with one
+    # SELECT ... IN per relation, and relations left out of `expand` are not queried at all.
+    selected = selected_relations(expand, relations)
+    return [joinedload(models.Project.owner)] + [
+        selectinload(relation) if name in selected else noload(relation)
+        for name, relation in relations.items()
+    ]
+
+def project_load_options(expand: Optional[str] = None):
+    return load_options(expand, {"members": models.Project.members})
+
+def project_relations(expand: Optional[str] = None):
+    return selected_relations(expand, ["members"])
+
+def requested_ids(ids):
+    """Drop repeated ids, keeping the requested order, and enforce ``BATCH_MAX_IDS``."""
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_IDS} ids per request")
+    return ids
+
+def project_ids(ids: Optional[str] = None):
+    if ids is None:
+        return None
+    try:
+        return requested_ids([int(value) for value in ids.split(",") if value.strip()])
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+
+def project_list_statement():
+    return (
+        select(*PROJECT_COLUMNS, models.User.username.label("owner_username"))
+        .outerjoin(models.User, models.User.id == models.Project.owner_id)
+    )
+
+async def projects_by_id(db: AsyncSession, ids):
+    """Fetch ``ids`` with one ``IN`` query; returns the rows in requested order and the ids not found."""
+    found = {}
+    if ids:
+        result = await db.execute(project_list_statement().filter(models.Project.id.in_(ids)))
+        found = {row.id: row for row in result}
+    return [found[project_id] for project_id in ids if project_id in found], [project_id for project_id in ids if project_id not in found]
+
+async def project_rows(db: AsyncSession, rows, relations):
+    """Build ``schemas.Project``-shaped dicts from ``PROJECT_COLUMNS`` rows plus the
+    owner's username, loading members for the whole page with one query."""
+    projects = []
+    for row in rows:
+        project = row._asdict()
+        username = project.pop("owner_username")
+        project["owner"] = {"id": row.owner_id, "username": username} if username is not None else None
+        project["members"] = []
+        projects.append(project)
+    by_id = {project["id"]: project for project in projects}
+    if by_id and "members" in relations:
+        members = models.project_users
+        result = await db.execute(
+            select(members.c.project_id, models.User.id, models.User.username)
+            .join(models.User, models.User.id == members.c.user_id)
+            .filter(members.c.project_id.in_(by_id))
+            .order_by(models.User.id)
+        )
+        for project_id, user_id, username in result:
+            by_id[project_id]["members"].append({"id": user_id, "username": username})
+    return projects
+
+def project_detail_load_options(expand: Optional[str] = None):
+    return load_options(expand, {"members": models.Project.members, "tasks": models.Project.tasks})
+
+async def get_project(db: AsyncSession, project_id: int, options=None):
+    result = await db.execute(
+        select(models.Project)
+        .options(*(options or project_load_options()))
+        .filter(models.Project.id == project_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
+
 @router.post("/", response_model=schemas.Project)
-async def create_project(project: schemas.ProjectCreate, db: Session = Depends(get_db)):
+async def create_project(project: schemas.ProjectCreate, db: AsyncSession = Depends(get_db)):
     db_project = models.Project(**project.dict(), owner_id=1)  # Hardcoded owner_id for now
     db.add(db_project)
-    db.commit()
-    db.refresh(db_project)
-    await notifications.send_notification(db_project.owner_id, f"New project created: {db_project.name}")
+    await db.commit()
+    db_project = await get_project(db, db_project.id)
+    notifications.send_notification(db_project.owner_id, f"New project created: {db_project.name}")
     return db_project
 
 @router.get("/", response_model=List[schemas.Project])
-def read_projects(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    projects = db.query(models.Project).offset(skip).limit(limit).all()
-    return projects
+async def read_projects(request: Request, response: Response, ids: Optional[list] = Depends(project_ids), cursor: Optional[str] = None, skip: int = 0, limit: int = 100, relations: set = Depends(project_relations), db: AsyncSession = Depends(get_db)):
+    if ids is not None:
+        # `ids` replaces paging: the projects come back in the requested order.
+        rows, missing = await projects_by_id(db, ids)
+        if missing:
+            response.headers["X-Missing-Ids"] = ",".join(map(str, missing))
+    else:
+        rows = await paginate(db, project_list_statement(), [models.Project.id], response, cursor=cursor, limit=limit, skip=skip, scalars=False)
+    # Lists only get an ETag: a deleted row changes the page without moving any updated_at.
+    # The expanded relations are part of it, like the variant in the single-item ETags.
+    response.headers["ETag"] = make_etag(sorted(relations), *[(row.id, row.updated_at) for row in rows])
+    unchanged = not_modified(request, response.headers)
+    if unchanged is not None:
+        return unchanged
+    return respond(await project_rows(db, rows, relations), response)
+
+@router.post("/batch_get", response_model=schemas.ProjectBatch)
+async def batch_get_projects(batch: schemas.ProjectIds, response: Response, relations: set = Depends(project_relations), db: AsyncSession = Depends(get_db)):
+    rows, missing = await projects_by_id(db, requested_ids(batch.ids))
+    return respond({"items": await project_rows(db, rows, relations), "missing": missing}, response)
 
 @router.get("/{project_id}", response_model=schemas.ProjectWithTasks)
-def read_project(project_id: int, db: Session = Depends(get_db)):
-    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+async def read_project(project_id: int, request: Request, expand: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    variant = "default" if expand is None else expand
+    cached = await cache.get(f"project:{project_id}", variant)
+    if cached is not None:
+        return not_modified(request, cached.headers) or cached
+    generation = await cache.generation(f"project:{project_id}")
+    project = await get_project(db, project_id, project_detail_load_options(expand))
     if project is None:
         raise HTTPException(status_code=404, detail="Project not found")
-    return project
+    # Tasks are written by the tasks service without touching the project row, so
+    # their own timestamps feed the validators too (and it invalidates this entry).
+    tasks = [(task.id, task.updated_at) for task in project.tasks]
+    modified = max([project.updated_at] + [updated_at for _, updated_at in tasks if updated_at is not None])
+    headers = validators(make_etag("project", project.id, project.updated_at, variant, tasks), modified)
+    unchanged = not_modified(request, headers)
+    if unchanged is not None:
+        return unchanged
+    body = render(schemas.ProjectWithTasks.from_orm(project))
+    await cache.set(f"project:{project_id}", variant, body, headers, generation=generation)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/{project_id}/summary", response_model=schemas.ProjectSummary)
+async def read_project_summary(project_id: int, db: AsyncSession = Depends(get_db)):
+    # The tasks service invalidates this entry on task writes; the short SUMMARY_CACHE_TTL
+    # only bounds how long `overdue` lags behind due dates passing.
+    cached = await cache.get(f"project:{project_id}:summary", "default")
+    if cached is not None:
+        return cached
+    generation = await cache.generation(f"project:{project_id}:summary")
+    exists = await db.execute(select(models.Project.id).filter(models.Project.id == project_id))
+    if exists.scalar() is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    Task = models.Task
+    is_open = Task.status.notin_(CLOSED_STATUSES)
+    is_overdue = is_open & (Task.due_date < datetime.utcnow())
+    groups = await db.execute(
+        select(Task.status, Task.priority, func.count(), func.count().filter(is_open), func.count().filter(is_overdue))
+        .filter(Task.project_id == project_id)
+        .group_by(Task.status, Task.priority)
+    )
+    summary = {"project_id": project_id, "total": 0, "open": 0, "overdue": 0, "by_status": {}, "by_priority": {}}
+    for status, priority, total, open_count, overdue in groups:
+        summary["total"] += total
+        summary["open"] += open_count
+        summary["overdue"] += overdue
+        summary["by_status"][status] = summary["by_status"].get(status, 0) + total
+        summary["by_priority"][priority] = summary["by_priority"].get(priority, 0) + total
+    members = await db.execute(
+        select(Task.user_id, models.User.username, func.count(), func.count().filter(is_open), func.count().filter(is_overdue))
+        .outerjoin(models.User, Task.user_id == models.User.id)
+        .filter(Task.project_id == project_id)
+        .group_by(Task.user_id, models.User.username)
+        .order_by(func.count().filter(is_open).desc(), Task.user_id)
+    )
+    summary["members"] = [
+        {"user_id": user_id, "username": username, "total": total, "open": open_count, "overdue": overdue}
+        for user_id, username, total, open_count, overdue in members
+    ]
+    body = render(summary)
+    await cache.set(f"project:{project_id}:summary", "default", body, ttl=SUMMARY_CACHE_TTL, generation=generation)
+    return Response(content=body, media_type="application/json")
 
 @router.put("/{project_id}", response_model=schemas.Project)
-def update_project(project_id: int, project: schemas.ProjectUpdate, db: Session = Depends(get_db)):
-    db_project = db.query(models.Project).filter(models.Project.id == project_id).first()
+async def update_project(project_id: int, project: schemas.ProjectUpdate, db: AsyncSession = Depends(get_db)):
+    db_project = await get_project(db, project_id)
     if db_project is None:
         raise HTTPException(status_code=404, detail="Project not found")
     for key, value in project.dict().items():
         setattr(db_project, key, value)
-    db.commit()
-    db.refresh(db_project)
-    return db_project
+    await db.commit()
+    await cache.invalidate(f"project:{project_id}")
+    return await get_project(db, project_id)
 
 @router.delete("/{project_id}", response_model=schemas.Project)
-def delete_project(project_id: int, db: Session = Depends(get_db)):
-    db_project = db.query(models.Project).filter(models.Project.id == project_id).first()
+async def delete_project(project_id: int, db: AsyncSession = Depends(get_db)):
+    db_project = await get_project(db, project_id, project_detail_load_options())
     if db_project is None:
         raise HTTPException(status_code=404, detail="Project not found")
-    db.delete(db_project)
-    db.commit()
-    return db_project
+    deleted = schemas.Project.from_orm(db_project)
+    await db.delete(db_project)
+    await db.commit()
+    await cache.invalidate(f"project:{project_id}", f"project:{project_id}:summary")
+    return deleted
 
 @router.post("/{project_id}/members/{user_id}", response_model=schemas.Project)
-async def add_project_member(project_id: int, user_id: int, db: Session = Depends(get_db)):
-    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+async def add_project_member(project_id: int, user_id: int, db: AsyncSession = Depends(get_db)):
+    project = await get_project(db, project_id)
     if project is None:
         raise HTTPException(status_code=404, detail="Project not found")
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = await db.get(models.User, user_id)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     project.members.append(user)
-    db.commit()
-    db.refresh(project)
-    await notifications.send_notification(user_id, f"You have been added to project: {project.name}")
-    return project
\ No newline at end of file
+    # Membership only touches project_users, so bump updated_at explicitly to move the ETag.
+    project.updated_at = datetime.utcnow()
+    await db.commit()
+    await cache.invalidate(f"project:{project_id}")
+    project = await get_project(db, project_id)
+    notifications.send_notification(user_id, f"You have been added to project: {project.name}")
+    return project
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 class UserBase(BaseModel):
     username: str
@@ -32,6 +32,13 @@ class Project(ProjectBase):
     class Config:
         orm_mode = True
 
+class ProjectIds(BaseModel):
+    ids: List[int]
+
+class ProjectBatch(BaseModel):
+    items: List[Project] = []
+    missing: List[int] = []
+
 class ProjectWithTasks(Project):
     tasks: List['Task'] = []
 
@@ -45,4 +52,20 @@ class Task(TaskBase):
     class Config:
         orm_mode = True
 
+class MemberLoad(BaseModel):
+    user_id: Optional[int]
+    username: Optional[str]
+    total: int
+    open: int
+    overdue: int
+
+class ProjectSummary(BaseModel):
+    project_id: int
+    total: int
+    open: int
+    overdue: int
+    by_status: Dict[str, int]
+    by_priority: Dict[str, int]
+    members: List[MemberLoad]
+
 ProjectWithTasks.update_forward_refs()
\ No newline at end of file
@@ -1,7 +1,27 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from app.database import async_engine
+from app.observability import instrument_app
+from app.cache import cache
+from app.notifications import emitter
 from app.routes import router as projects_router
 
-app = FastAPI(title="Projects Service", version="0.1.0")
+app = FastAPI(title="Projects Service", version="0.1.0", default_response_class=ORJSONResponse)
+instrument_app(app, async_engine)
+
+@app.on_event("startup")
+async def startup():
+    await cache.start()
+    await emitter.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await emitter.close()
+    await cache.close()
+
+@app.get("/internal/notifications", include_in_schema=False)
+def notification_stats():
+    return emitter.stats()
 
 app.include_router(projects_router, prefix="/projects", tags=["projects"])
 
@@ -1,20 +1,38 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from pydantic import BaseModel
 from typing import Optional
+from urllib.parse import unquote
 import os
 
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 ALGORITHM = "HS256"
+# Accept the identity headers set by the API gateway instead of decoding the JWT again.
+# Only enable when the service is reachable exclusively through the gateway.
+TRUSTED_UPSTREAM = os.getenv("TRUSTED_UPSTREAM", "false").lower() in ("1", "true", "yes")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 class TokenData(BaseModel):
     username: Optional[str] = None
     role: Optional[str] = None
+    user_id: Optional[int] = None
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+def get_trusted_user(request: Request):
+    username = request.headers.get("x-user-name")
+    if not TRUSTED_UPSTREAM or username is None:
+        return None
+    return TokenData(
+        username=unquote(username),
+        role=request.headers.get("x-user-role"),
+        user_id=request.headers.get("x-user-id"),
+    )
+
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)):
+    trusted_user = get_trusted_user(request)
+    if trusted_user is not None:
+        return trusted_user
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -24,9 +42,9 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         role: str = payload.get("role")
-        if username is None:
+        if username is None or payload.get("type") == "refresh":
             raise credentials_exception
-        token_data = TokenData(username=username, role=role)
+        token_data = TokenData(username=username, role=role, user_id=payload.get("uid"))
     except JWTError:
         raise credentials_exception
     return token_data
@@ -0,0 +1,166 @@
+from collections import OrderedDict
+from fastapi import Response
+import asyncio
+import json
+import os
+import time
+import redis.asyncio as redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_TTL = int(os.getenv("CACHE_TTL", "60"))
+LOCAL_CACHE_TTL = float(os.getenv("LOCAL_CACHE_TTL", "10"))
+LOCAL_CACHE_SIZE = int(os.getenv("LOCAL_CACHE_SIZE", "2048"))
+# Generation counters only need to outlive any single read that overlaps an invalidation.
+GENERATION_TTL = 86400
+
+# Store a variant only if the key's generation is still the one read before the database load.
+SET_IF_CURRENT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[2], ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+class ResponseCache:
+    """Two-tier cache of serialized JSON responses: a per-process LRU in front of Redis.
+
+    Each key holds one entity and maps to a Redis hash with one field per response
+    variant (e.g. per ``expand`` value), so invalidating a key drops every variant.
+    Invalidations are broadcast over pub/sub to clear the local tier of other processes;
+    the short local TTL bounds staleness if a broadcast is missed.
+
+    Every invalidation also bumps a per-key generation. Readers take ``generation()``
+    before loading from the database and pass it to ``set()``, which drops the write if
+    an invalidation landed in between, so a slow read cannot put back a stale body.
+    """
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self.channel = f"{namespace}:invalidate"
+        self._local = OrderedDict()
+        self._redis = None
+        self._listener = None
+        self._set_if_current = None
+
+    async def start(self):
+        if not CACHE_ENABLED:
+            return
+        self._redis = redis.from_url(REDIS_URL)
+        self._set_if_current = self._redis.register_script(SET_IF_CURRENT)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    def _redis_key(self, key: str):
+        return f"{self.namespace}:{key}"
+
+    def _generation_key(self, key: str):
+        return f"{self.namespace}:gen:{key}"
+
+    async def get(self, key: str, variant: str):
+        entry = self._local.get(key, {}).get(variant)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._local.move_to_end(key)
+                return _to_response(value)
+            del self._local[key][variant]
+        if self._redis is None:
+            return None
+        try:
+            value = await self._redis.hget(self._redis_key(key), variant)
+        except redis.RedisError as e:
+            logger.warning("Error reading cache: %s", e)
+            return None
+        if value is None:
+            return None
+        self._store_local(key, variant, value)
+        return _to_response(value)
+
+    async def generation(self, key: str):
+        """Current generation of ``key``; None when it cannot be read, which makes ``set`` a no-op."""
+        if self._redis is None:
+            return None
+        try:
+            value = await self._redis.get(self._generation_key(key))
+        except redis.RedisError as e:
+            logger.warning("Error reading cache generation: %s", e)
+            return None
+        return value.decode() if value is not None else "0"
+
+    async def set(self, key: str, variant: str, body: bytes, headers: dict = None, ttl: int = None, *, generation):
+        if self._redis is None or generation is None:
+            return
+        value = json.dumps(headers or {}).encode() + b"\n" + body
+        try:
+            stored = await self._set_if_current(
+                keys=[self._redis_key(key), self._generation_key(key)],
+                args=[generation, variant, value, ttl or CACHE_TTL],
+            )
+        except redis.RedisError as e:
+            logger.warning("Error writing cache: %s", e)
+            return
+        if stored:
+            self._store_local(key, variant, value)
+
+    async def invalidate(self, *keys: str):
+        self._drop_local(keys)
+        if self._redis is None or not keys:
+            return
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.delete(*[self._redis_key(key) for key in keys])
+                for key in keys:
+                    pipe.incr(self._generation_key(key))
+                    pipe.expire(self._generation_key(key), GENERATION_TTL)
+                pipe.publish(self.channel, json.dumps(keys))
+                await pipe.execute()
+        except redis.RedisError as e:
+            logger.warning("Error invalidating cache: %s", e)
+
+    def _store_local(self, key, variant, value):
+        self._local.setdefault(key, {})[variant] = (time.monotonic() + LOCAL_CACHE_TTL, value)
+        self._local.move_to_end(key)
+        while len(self._local) > LOCAL_CACHE_SIZE:
+            self._local.popitem(last=False)
+
+    def _drop_local(self, keys):
+        for key in keys:
+            self._local.pop(key, None)
+
+    async def _listen(self):
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._drop_local(json.loads(message["data"]))
+            except (redis.RedisError, OSError) as e:
+                logger.warning("Cache invalidation listener error: %s", e)
+                # Anything cached locally may have missed an invalidation while disconnected.
+                self._local.clear()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.reset()
+
+def _to_response(value: bytes):
+    headers, _, body = value.partition(b"\n")
+    return Response(content=body, media_type="application/json", headers=json.loads(headers))
+
+cache = ResponseCache("tasks")
+# The projects service caches views built from task rows (project detail, summary) in the
+# same Redis database; task writes invalidate those keys through this handle.
+project_cache = ResponseCache("projects")
@@ -0,0 +1,75 @@
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func, insert, literal, literal_column, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from . import models
+
+TASK = "task"
+COMMENT = "comment"
+TAG = "tag"
+UPSERT = "upsert"
+DELETE = "delete"
+
+# Same shape as schemas.Task plus project_id; comments have their own events.
+TASK_FIELDS = ("id", "title", "description", "status", "priority", "due_date", "created_at", "updated_at", "user_id",
+               "project_id")
+
+# Transaction-level advisory lock taken before events are inserted. Writers hold it from
+# drawing their sequence numbers until they commit, so seq order is commit order and a
+# reader that has seen seq N has already seen every event below it.
+WRITE_LOCK_KEY = 0x7461736B
+
+events_table = models.TaskEvent.__table__
+
+def _pending(db):
+    return db.sync_session.info.setdefault("task_events", [])
+
+def _tags_json():
+    tag = models.Tag.__table__
+    return (
+        select(func.coalesce(
+            func.jsonb_agg(aggregate_order_by(func.jsonb_build_object("id", tag.c.id, "name", tag.c.name), tag.c.name)),
+            literal_column("'[]'::jsonb"),
+        ))
+        .select_from(models.task_tags.join(tag))
+        .where(models.task_tags.c.task_id == models.Task.__table__.c.id)
+        .scalar_subquery()
+    )
+
+def _task_snapshots(task_ids):
+    task = models.Task.__table__
+    snapshot = func.jsonb_build_object(*[part for name in TASK_FIELDS for part in (name, task.c[name])], "tags", _tags_json())
+    return insert(events_table).from_select(
+        ["entity", "entity_id", "op", "data"],
+        select(literal(TASK), task.c.id, literal(UPSERT), snapshot)
+        .where(task.c.id.in_(task_ids))
+        .order_by(task.c.id),
+    )
+
+def record_tasks(db, task_ids):
+    """Log ``task_ids`` as upserts; their state is read back when the events are written."""
+    if task_ids:
+        _pending(db).append((_task_snapshots(list(task_ids)), None))
+
+def record(db, entity: str, rows):
+    """Log ``rows`` (schema objects or dicts with an ``id``) as upserts of ``entity``."""
+    rows = [jsonable_encoder(row) for row in rows]
+    if rows:
+        _pending(db).append((insert(events_table), [
+            {"entity": entity, "entity_id": row["id"], "op": UPSERT, "data": row} for row in rows
+        ]))
+
+def record_deleted(db, entity: str, ids):
+    if ids:
+        _pending(db).append((insert(events_table), [
+            {"entity": entity, "entity_id": entity_id, "op": DELETE, "data": None} for entity_id in ids
+        ]))
+
+async def commit(db):
+    """Flush, write the events recorded on ``db`` under ``WRITE_LOCK_KEY`` and commit."""
+    pending = db.sync_session.info.pop("task_events", [])
+    await db.flush()
+    if pending:
+        await db.execute(select(func.pg_advisory_xact_lock(WRITE_LOCK_KEY)))
+        for statement, params in pending:
+            await db.execute(statement, params)
+    await db.commit()
@@ -0,0 +1,51 @@
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response
+import hashlib
+import json
+
+# Entity headers that describe a body and must not be sent with a 304.
+BODY_HEADERS = {"content-length", "content-type"}
+
+def make_etag(*parts):
+    """Weak ETag over the ids and ``updated_at`` values a representation is built from."""
+    digest = hashlib.sha1(json.dumps(parts, default=str, separators=(",", ":")).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+def validators(etag: str, modified=None):
+    headers = {"ETag": etag}
+    if modified is not None:
+        headers["Last-Modified"] = format_datetime(modified.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+    return headers
+
+def _weak(tag: str):
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+def _parse_date(value):
+    try:
+        return parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+
+def not_modified(request: Request, headers):
+    """Return a 304 carrying ``headers`` if the request's validators still match, else None.
+
+    If-None-Match takes precedence over If-Modified-Since (RFC 7232, section 6).
+    """
+    etag = headers.get("ETag") or headers.get("etag")
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        matched = etag is not None and (
+            if_none_match.strip() == "*" or _weak(etag) in {_weak(tag) for tag in if_none_match.split(",")}
+        )
+    else:
+        since = _parse_date(request.headers.get("if-modified-since"))
+        modified = _parse_date(headers.get("Last-Modified") or headers.get("last-modified"))
+        matched = since is not None and modified is not None and modified <= since
+    if not matched:
+        return None
+    return Response(
+        status_code=304,
+        headers={name: value for name, value in headers.items() if name.lower() not in BODY_HEADERS},
+    )
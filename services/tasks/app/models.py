@@ -1,13 +1,18 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Table
-from sqlalchemy.orm import relationship
+from sqlalchemy import BigInteger, Column, Computed, Integer, String, Boolean, ForeignKey, DateTime, Table, Index, func, literal_column
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
 Base = declarative_base()
 
+# Text search configuration baked into the generated search columns; queries must use the same one.
+SEARCH_CONFIG = "english"
+
 task_tags = Table('task_tags', Base.metadata,
-    Column('task_id', Integer, ForeignKey('tasks.id')),
-    Column('tag_id', Integer, ForeignKey('tags.id'))
+    Column('task_id', Integer, ForeignKey('tasks.id'), primary_key=True),
+    Column('tag_id', Integer, ForeignKey('tags.id'), primary_key=True),
+    Index('ix_task_tags_tag_id_task_id', 'tag_id', 'task_id')
 )
 
 class Task(Base):
@@ -22,11 +27,28 @@ class Task(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     user_id = Column(Integer, ForeignKey("users.id"))
+    # Owned by the projects service, whose metadata declares the foreign key.
+    project_id = Column(Integer)
+    # Maintained by Postgres; deferred so ordinary task reads don't fetch it.
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')",
+        persisted=True,
+    )))
 
     user = relationship("User", back_populates="tasks")
     tags = relationship("Tag", secondary=task_tags, back_populates="tasks")
     comments = relationship("Comment", back_populates="task")
 
+    __table_args__ = (
+        Index("ix_tasks_user_id_status_due_date", "user_id", "status", "due_date"),
+        Index("ix_tasks_status_priority", "status", "priority"),
+        Index("ix_tasks_project_id_status", "project_id", "status"),
+        Index("ix_tasks_due_date", "due_date", postgresql_where=due_date.isnot(None)),
+        Index("ix_tasks_due_sort_id", func.coalesce(due_date, literal_column("'infinity'::timestamp")), "id"),
+        Index("ix_tasks_search_vector", search_vector, postgresql_using="gin"),
+    )
+
 class User(Base):
     __tablename__ = "users"
 
@@ -51,6 +73,30 @@ class Comment(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     task_id = Column(Integer, ForeignKey("tasks.id"))
     user_id = Column(Integer, ForeignKey("users.id"))
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        f"to_tsvector('{SEARCH_CONFIG}', coalesce(content, ''))",
+        persisted=True,
+    )))
 
     task = relationship("Task", back_populates="comments")
-    user = relationship("User")
\ No newline at end of file
+    user = relationship("User")
+
+    __table_args__ = (
+        Index("ix_comments_task_id_id", "task_id", "id"),
+        Index("ix_comments_search_vector", search_vector, postgresql_using="gin"),
+    )
+
+class TaskEvent(Base):
+    """Append-only log of task, comment and tag changes, read by ``GET /tasks/changes``.
+
+    ``seq`` is drawn in commit order (see ``changes.commit``); the primary key index is
+    what delta reads scan. Deletes are recorded as tombstones with no ``data``.
+    """
+    __tablename__ = "task_events"
+
+    seq = Column(BigInteger, primary_key=True)
+    entity = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    op = Column(String, nullable=False)
+    data = Column(JSONB(none_as_null=True))
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -1,15 +1,127 @@
+from .observability import REQUEST_ID_HEADER, request_id_var
+import asyncio
 import httpx
 import os
+import logging
+
+logger = logging.getLogger(__name__)
 
 NOTIFICATION_SERVICE_URL = os.getenv("NOTIFICATION_SERVICE_URL", "http://notification-service:8000")
+QUEUE_SIZE = int(os.getenv("NOTIFICATION_QUEUE_SIZE", "10000"))
+BATCH_SIZE = int(os.getenv("NOTIFICATION_BATCH_SIZE", "100"))
+FLUSH_INTERVAL = float(os.getenv("NOTIFICATION_FLUSH_INTERVAL", "0.2"))
+MAX_RETRIES = int(os.getenv("NOTIFICATION_MAX_RETRIES", "5"))
+RETRY_BACKOFF = float(os.getenv("NOTIFICATION_RETRY_BACKOFF", "0.5"))
+SHUTDOWN_TIMEOUT = float(os.getenv("NOTIFICATION_SHUTDOWN_TIMEOUT", "5"))
+
+class NotificationEmitter:
+    """Fire-and-forget notification sender.
+
+    ``emit`` only enqueues into a bounded in-process queue and never waits on the
+    notification service; a background worker posts queued notifications in batches
+    over one pooled client, retrying transient failures with exponential backoff.
+    Notifications are dropped, and counted, when the queue is full or they are invalid.
+    """
+
+    def __init__(self):
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue = None
+        self._client = None
+        self._worker = None
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._client = httpx.AsyncClient(base_url=NOTIFICATION_SERVICE_URL, timeout=5.0)
+        self._worker = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.info("Dropping %s queued notifications on shutdown", self._queue.qsize())
+        self._worker.cancel()
+        self._worker = None
+        await self._client.aclose()
 
-async def send_notification(user_id: int, message: str):
-    async with httpx.AsyncClient() as client:
+    def emit(self, user_id: int, message: str):
+        if self._queue is None:
+            self.dropped += 1
+            return
+        # The batch endpoint validates the whole list at once, so one bad item would
+        # get every other notification in its batch rejected.
+        if not isinstance(user_id, int) or not isinstance(message, str):
+            logger.warning("Dropping invalid notification for user %r", user_id)
+            self.dropped += 1
+            return
         try:
-            response = await client.post(
-                f"{NOTIFICATION_SERVICE_URL}/notifications/",
-                json={"user_id": user_id, "message": message}
-            )
-            response.raise_for_status()
-        except httpx.HTTPError as e:
-            print(f"Error sending notification: {e}")
+            self._queue.put_nowait(({"user_id": user_id, "message": message}, request_id_var.get()))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def stats(self):
+        return {
+            "backlog": self._queue.qsize() if self._queue is not None else 0,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + FLUSH_INTERVAL
+            while len(batch) < BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._send(batch)
+            except Exception:
+                # Keep the worker alive; a dead worker would leave every later emit queued until dropped.
+                logger.exception("Error sending notifications")
+                self.failed += len(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _send(self, batch):
+        # A batch carries the IDs of every request that contributed to it.
+        request_id = ",".join(dict.fromkeys(request_id for _, request_id in batch))
+        token = request_id_var.set(request_id)
+        try:
+            await self._post([notification for notification, _ in batch], {REQUEST_ID_HEADER: request_id})
+        finally:
+            request_id_var.reset(token)
+
+    async def _post(self, batch, headers):
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                response = await self._client.post("/notifications/batch", json=batch, headers=headers)
+                if response.status_code < 500:
+                    response.raise_for_status()
+                    self.sent += len(batch)
+                    return
+                logger.warning("Error sending notifications: status %s", response.status_code)
+            except httpx.HTTPStatusError as e:
+                # Client errors will not succeed on retry.
+                logger.warning("Error sending notifications: %s", e)
+                break
+            except httpx.HTTPError as e:
+                logger.warning("Error sending notifications: %s", e)
+            if attempt < MAX_RETRIES:
+                await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+        self.failed += len(batch)
+
+emitter = NotificationEmitter()
+
+def send_notification(user_id: int, message: str):
+    emitter.emit(user_id, message)
@@ -0,0 +1,72 @@
+from datetime import datetime
+from fastapi import HTTPException, Response
+from sqlalchemy import DateTime, Integer, String, tuple_
+import base64
+import json
+
+NEXT = "next"
+PREV = "prev"
+
+def encode_cursor(values, direction: str):
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps({"k": payload, "d": direction}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _cursor_value(key, value):
+    # Values come from the client, so check them against the key's type before they are bound.
+    if isinstance(key.type, DateTime):
+        return datetime.fromisoformat(value)
+    expected = int if isinstance(key.type, Integer) else str if isinstance(key.type, String) else None
+    if expected is None or type(value) is not expected:
+        raise ValueError(value)
+    return value
+
+def decode_cursor(cursor: str, keys):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        values, direction = data["k"], data["d"]
+        if direction not in (NEXT, PREV) or len(values) != len(keys):
+            raise ValueError(cursor)
+        return [_cursor_value(key, value) for key, value in zip(keys, values)], direction
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def paginate(db, stmt, keys, response: Response, cursor=None, limit: int = 100, skip: int = 0,
+                   descending: bool = False, values_of=None, scalars: bool = True):
+    """Run ``stmt`` as one keyset page ordered by ``keys``, with ``keys`` ending in a unique column.
+
+    Opaque cursors for the neighbouring pages are returned in the ``X-Next-Cursor`` and
+    ``X-Prev-Cursor`` headers. ``skip`` is only honoured on the first page. Keys that are
+    expressions rather than mapped columns need ``values_of`` to read their values from a row.
+    Column projections pass ``scalars=False`` to get rows back instead of their first column.
+    """
+    direction = NEXT
+    if cursor is not None:
+        values, direction = decode_cursor(cursor, keys)
+        forward = (direction == NEXT) != descending
+        row_key, bound = tuple_(*keys), tuple_(*values)
+        stmt = stmt.where(row_key > bound if forward else row_key < bound)
+    elif skip:
+        stmt = stmt.offset(skip)
+
+    reverse = (direction == PREV) != descending
+    stmt = stmt.order_by(*[key.desc() if reverse else key.asc() for key in keys])
+    result = await db.execute(stmt.limit(limit + 1))
+    rows = (result.scalars() if scalars else result).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == PREV:
+        rows.reverse()
+
+    def key_of(row):
+        if values_of is not None:
+            return values_of(row)
+        return [getattr(row, key.key) for key in keys]
+
+    if rows:
+        if has_more or direction == PREV:
+            response.headers["X-Next-Cursor"] = encode_cursor(key_of(rows[-1]), NEXT)
+        if (has_more and direction == PREV) or (direction == NEXT and (cursor is not None or skip)):
+            response.headers["X-Prev-Cursor"] = encode_cursor(key_of(rows[0]), PREV)
+    return rows
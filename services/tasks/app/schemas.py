@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 class TagBase(BaseModel):
     name: str
@@ -51,4 +51,44 @@ class Task(TaskBase):
     comments: List[Comment] = []
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class TaskSearchHighlight(BaseModel):
+    title: str
+    description: str
+
+class TaskSearchResult(Task):
+    rank: float
+    highlight: TaskSearchHighlight
+
+class TaskBulkUpdate(TaskUpdate):
+    id: int
+
+class TaskBulkRequest(BaseModel):
+    create: List[TaskCreate] = []
+    update: List[TaskBulkUpdate] = []
+    delete: List[int] = []
+
+class TaskIds(BaseModel):
+    ids: List[int]
+
+class TaskBatch(BaseModel):
+    items: List[Task] = []
+    missing: List[int] = []
+
+class TaskBulkResult(BaseModel):
+    created: List[int] = []
+    updated: List[int] = []
+    deleted: List[int] = []
+
+class Change(BaseModel):
+    seq: int
+    entity: str
+    id: int
+    op: str
+    data: Optional[Dict[str, Any]] = None
+
+class ChangeFeed(BaseModel):
+    changes: List[Change] = []
+    next_since: int
+    has_more: bool